@@ -1,14 +1,27 @@
 import os
 import io
+import re
 import json
+import time
+import queue
+import asyncio
+import hashlib
+import functools
+import threading
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 import streamlit.components.v1 as components
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+try:
+    import polars as pl
+except ImportError:  # optional accelerator; the pandas path still works
+    pl = None
+
 # ---------------------------
 # Load environment variables
 # ---------------------------
@@ -21,80 +34,400 @@ if GEMINI_API_KEY:
 # ---------------------------
 # Utility: LLM call
 # ---------------------------
-def generate_paperscript(prompt: str) -> str:
+@functools.lru_cache(maxsize=4)
+def _model(name: str = "gemini-1.5-pro") -> genai.GenerativeModel:
+    """One client handle per model name, built once per process."""
+    return genai.GenerativeModel(name)
+
+# Fail fast instead of hanging on the SDK's default deadline.
+_REQUEST_OPTIONS = {"timeout": 30}
+
+@st.cache_resource
+def _gemini_slots() -> threading.Semaphore:
+    """
+    Process-wide cap on in-flight Gemini calls. Streamlit runs each
+    session on its own thread, so without this a burst of sessions can
+    pile onto the API and trip rate limits; eight concurrent calls is
+    comfortably under the paid-tier rpm defaults.
+    """
+    return threading.Semaphore(8)
+
+# Gemini often wraps code in ```javascript fences despite the "no
+# markdown" instruction, which Paper.js then fails to compile.
+_FENCE_RE = re.compile(
+    r"^\s*```(?:javascript|js|paperscript)?\s*\n?|\n?```\s*$", re.MULTILINE
+)
+
+def _strip_fences(text: str) -> str:
+    """Strip markdown code fences so the first response is compilable."""
+    return _FENCE_RE.sub("", text).strip()
+
+def _prompt_fingerprint(prompt: str) -> str:
+    """Short stable key for a prompt, used by the session-level cache."""
+    return hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+
+_PS_CACHE_MAX = 256
+
+def _session_cache_get(prompt: str):
+    """Return a previously generated PaperScript for this prompt, if any."""
+    cache = st.session_state.setdefault("ps_cache", {})
+    fp = _prompt_fingerprint(prompt)
+    if fp in cache:
+        # Re-insert so the dict stays ordered by recency (cheap LRU).
+        cache[fp] = cache.pop(fp)
+        return cache[fp]
+    return None
+
+def _session_cache_put(prompt: str, paperscript: str) -> None:
+    cache = st.session_state.setdefault("ps_cache", {})
+    cache[_prompt_fingerprint(prompt)] = paperscript
+    while len(cache) > _PS_CACHE_MAX:
+        cache.pop(next(iter(cache)))
+
+# Second tier: semantic cache. Journal entries tend to be structurally
+# similar with small wording changes, so exact-match caching misses most
+# reuse. Embed the raw entry text and reuse the stored script when a
+# prior entry is close enough in cosine similarity.
+_SEMANTIC_SIM_THRESHOLD = 0.92
+
+def _embed_text(text: str) -> np.ndarray:
+    """Unit-norm embedding of `text` via Gemini's text-embedding-004."""
+    result = genai.embed_content(model="models/text-embedding-004", content=text)
+    v = np.asarray(result["embedding"], dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
+
+def _semantic_cache_lookup(user_text: str):
+    """
+    Return (query_embedding, paperscript-or-None).
+
+    The embedding is returned even on a miss so the caller can store it
+    without a second embedding call.
+    """
+    try:
+        q = _embed_text(user_text)
+    except Exception:
+        return None, None
+    index = st.session_state.get("emb_index")
+    if index is None:
+        return q, None
+    sims = index @ q  # one gemv over all stored entries
+    best = int(sims.argmax())
+    if sims[best] > _SEMANTIC_SIM_THRESHOLD:
+        return q, st.session_state["emb_entries"][best][1]
+    return q, None
+
+def _semantic_cache_store(q: np.ndarray, user_text: str, paperscript: str) -> None:
+    index = st.session_state.get("emb_index")
+    st.session_state["emb_index"] = (
+        q[None, :] if index is None else np.vstack([index, q])
+    )
+    st.session_state.setdefault("emb_entries", []).append((user_text, paperscript))
+
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=256)
+def generate_paperscript(prompt: str, api_key: str = "",
+                         model_name: str = "gemini-1.5-pro",
+                         generation_config: dict = None) -> str:
     """
     Call Gemini to generate PaperScript (Paper.js) code.
 
     The model must return ONLY JavaScript/PaperScript code,
     no markdown, no explanation.
+
+    Cached on its arguments so re-submitting the exact same entry
+    returns the stored script instead of re-hitting the API.
     """
-    if not GEMINI_API_KEY:
+    if not api_key:
         # Fallback: a tiny static demo if no API key
         return DEFAULT_FALLBACK_PAPERSCRIPT
 
-    model = genai.GenerativeModel("gemini-1.5-pro")  # adjust if needed
-    response = model.generate_content(
-        prompt,
-        generation_config={"temperature": 0.9}
-    )
+    model = _model(model_name)
+    with _gemini_slots():
+        response = model.generate_content(
+            prompt,
+            generation_config=generation_config or {"temperature": 0.9},
+            request_options=_REQUEST_OPTIONS,
+        )
     # Depending on SDK version, .text or .candidates[0].content.parts...
     try:
-        return response.text
+        return _strip_fences(response.text)
     except AttributeError:
         # Very rough fallback
         return str(response)
 
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=256)
+def generate_paperscript_drafts(prompt: str, api_key: str = "", n: int = 3) -> list:
+    """
+    Generate several PaperScript candidates in a single Gemini call.
+
+    candidate_count costs one round-trip instead of n serial calls, and
+    the extra candidates are nearly free server-side at small batch sizes.
+    """
+    if not api_key:
+        return [DEFAULT_FALLBACK_PAPERSCRIPT]
+
+    model = _model("gemini-1.5-pro")
+    with _gemini_slots():
+        response = model.generate_content(
+            prompt,
+            generation_config={"candidate_count": n, "temperature": 0.9},
+            request_options=_REQUEST_OPTIONS,
+        )
+    drafts = []
+    for cand in response.candidates:
+        try:
+            drafts.append(_strip_fences("".join(part.text for part in cand.content.parts)))
+        except AttributeError:
+            continue
+    return drafts or [str(response)]
+
+async def _agen(prompt: str, temperature: float = 0.9) -> str:
+    """Await a single non-streamed Gemini completion."""
+    model = _model("gemini-1.5-pro")
+    response = await model.generate_content_async(
+        prompt,
+        generation_config={"temperature": temperature},
+        request_options=_REQUEST_OPTIONS,
+    )
+    try:
+        return _strip_fences(response.text)
+    except AttributeError:
+        return str(response)
+
+async def _astream(prompt: str, on_progress) -> str:
+    """
+    Stream a Gemini completion, calling `on_progress(text_so_far)` as
+    chunks arrive, and return the full text.
+    """
+    model = _model("gemini-1.5-pro")
+    response = await model.generate_content_async(
+        prompt,
+        generation_config={"temperature": 0.9},
+        stream=True,
+        request_options=_REQUEST_OPTIONS,
+    )
+    chunks = []
+    async for chunk in response:
+        # Some chunks (e.g. safety metadata) carry no text.
+        try:
+            if chunk.text:
+                chunks.append(chunk.text)
+                on_progress("".join(chunks))
+        except (AttributeError, ValueError):
+            continue
+    return _strip_fences("".join(chunks))
+
+@st.cache_resource
+def _async_loop() -> asyncio.AbstractEventLoop:
+    """
+    Long-lived event loop on a background thread.
+
+    google-generativeai caches its async grpc client module-wide, and
+    the channel binds to the loop it was first created on; running each
+    generation under its own asyncio.run would close that loop and leave
+    every later call failing on a dead channel.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+def generate_scene_and_annotation(scene_prompt: str, annotation_prompt: str,
+                                  on_progress) -> tuple:
+    """
+    Run the scene and annotation generations concurrently.
+
+    The two requests previously serialized on the Streamlit script
+    thread; gathering them makes wall-clock max(latencies), not the sum.
+    The scene streams through `on_progress` so the UI still builds live.
+    """
+    # Stream progress through a queue: the coroutines run on the shared
+    # background loop, but Streamlit elements must be touched from the
+    # script thread, which drains the queue while it waits.
+    updates = queue.Queue()
+
+    async def _both():
+        return await asyncio.gather(
+            _astream(scene_prompt, updates.put),
+            _agen(annotation_prompt, temperature=0.7),
+        )
+
+    with _gemini_slots():
+        future = asyncio.run_coroutine_threadsafe(_both(), _async_loop())
+        while not future.done():
+            try:
+                on_progress(updates.get(timeout=0.1))
+            except queue.Empty:
+                pass
+        while not updates.empty():
+            on_progress(updates.get_nowait())
+        return tuple(future.result())
+
 # ---------------------------
 # Paper.js HTML wrapper
 # ---------------------------
-def build_paper_html(paperscript_code: str, canvas_id: str = "dreamCanvas") -> str:
-    """
-    Wrap generated PaperScript into a minimal HTML page
-    that Streamlit can render via components.html.
-    """
-    # IMPORTANT: no backticks or <script> nesting issues.
-    html = f"""
+# Static page halves, split at the PaperScript seam, built once at
+# import instead of re-interpolated (and brace-escaped) on every click.
+_DEFAULT_CANVAS_ID = "dreamCanvas"
+
+_HTML_HEAD = """
 <!DOCTYPE html>
 <html>
   <head>
     <meta charset="UTF-8" />
-    <script type="text/javascript" src="https://cdnjs.cloudflare.com/ajax/libs/paper.js/0.12.15/paper-full.min.js"></script>
+    <link rel="preload" as="script" href="/app/static/paper-full.min.js" />
+    <script type="text/javascript" src="/app/static/paper-full.min.js"></script>
+    <script>
+      // Fall back to the CDN if the vendored copy is not deployed.
+      if (!window.paper) {
+        document.write('<script src="https://cdnjs.cloudflare.com/ajax/libs/paper.js/0.12.15/paper-full.min.js"><\\/script>');
+      }
+    </script>
     <style>
-      html, body {{
+      html, body {
         margin: 0;
         padding: 0;
         background: #111;
-      }}
-      canvas {{
+      }
+      canvas {
         width: 100%;
         height: 100%;
-      }}
-      #container {{
+      }
+      #container {
         width: 100%;
         height: 100vh;
-      }}
+      }
     </style>
   </head>
   <body>
     <div id="container">
-      <canvas id="{canvas_id}" resize></canvas>
+      <canvas id="dreamCanvas" resize></canvas>
     </div>
-    <script type="text/paperscript" canvas="{canvas_id}">
-{paperscript_code}
+    <script type="text/template" id="psSource">
+"""
+
+_HTML_TAIL = """
+    </script>
+    <script>
+    (function () {
+      var canvas = document.getElementById('dreamCanvas');
+      var source = document.getElementById('psSource').textContent;
+      var localUrl = new URL('/app/static/paper-full.min.js', document.baseURI).href;
+      var cdnUrl = 'https://cdnjs.cloudflare.com/ajax/libs/paper.js/0.12.15/paper-full.min.js';
+
+      function runInPage() {
+        var tag = document.createElement('script');
+        tag.type = 'text/paperscript';
+        tag.setAttribute('canvas', 'dreamCanvas');
+        tag.text = source;
+        document.body.appendChild(tag);
+        if (window.paper && paper.PaperScript && document.readyState === 'complete') {
+          paper.PaperScript.load();
+        }
+        document.addEventListener('visibilitychange', function () {
+          if (window.paper && paper.view) {
+            document.visibilityState === 'visible' ? paper.view.play() : paper.view.pause();
+          }
+        });
+      }
+
+      if (canvas.transferControlToOffscreen && window.Worker) {
+        // Compile and animate on a worker thread so frame CPU stays off
+        // the main thread during Streamlit reruns.
+        var workerSrc = [
+          "onmessage = function (e) {",
+          "  var d = e.data;",
+          "  if (d.type === 'init') {",
+          "    try { importScripts(d.localUrl); } catch (err) { importScripts(d.cdnUrl); }",
+          "    paper.setup(d.canvas);",
+          "    paper.PaperScript.execute(d.script, paper);",
+          "  } else if (d.type === 'visibility' && paper.view) {",
+          "    d.visible ? paper.view.play() : paper.view.pause();",
+          "  }",
+          "};"
+        ].join('\\n');
+        var worker = new Worker(URL.createObjectURL(
+          new Blob([workerSrc], { type: 'application/javascript' })
+        ));
+        worker.onerror = function () {
+          // Worker failed (e.g. Paper.js can't run offscreen here):
+          // swap in a fresh canvas, since the old one was transferred.
+          worker.terminate();
+          var fresh = canvas.cloneNode(false);
+          canvas.parentNode.replaceChild(fresh, canvas);
+          runInPage();
+        };
+        var off = canvas.transferControlToOffscreen();
+        worker.postMessage(
+          { type: 'init', canvas: off, script: source,
+            localUrl: localUrl, cdnUrl: cdnUrl },
+          [off]
+        );
+        document.addEventListener('visibilitychange', function () {
+          worker.postMessage({
+            type: 'visibility',
+            visible: document.visibilityState === 'visible'
+          });
+        });
+      } else {
+        runInPage();
+      }
+    })();
     </script>
   </body>
 </html>
+"""
+
+def build_paper_html(paperscript_code: str, canvas_id: str = _DEFAULT_CANVAS_ID) -> str:
+    """
+    Wrap generated PaperScript into a minimal HTML page
+    that Streamlit can render via components.html.
     """
+    # IMPORTANT: no backticks or <script> nesting issues.
+    html = _HTML_HEAD + paperscript_code + _HTML_TAIL
+    if canvas_id != _DEFAULT_CANVAS_ID:
+        html = html.replace(_DEFAULT_CANVAS_ID, canvas_id)
     return html
 
+def show_visual(paperscript: str) -> None:
+    """
+    Stage `paperscript` for rendering in the shared visualization slot.
+
+    The HTML is rebuilt only when the script hash changes; the actual
+    components.html call happens once per run into the persistent
+    vis_container placeholder, so unrelated widget reruns hand Streamlit
+    identical html in the same slot and the mounted Paper.js iframe
+    (including its animation state) is reused instead of torn down.
+    """
+    h = hashlib.blake2b(paperscript.encode()).hexdigest()
+    if h != st.session_state.get("last_ps_hash"):
+        st.session_state["last_ps_hash"] = h
+        st.session_state["last_ps_html"] = build_paper_html(paperscript)
+    # Remember which mode produced the visual so the render gate below
+    # doesn't resurface it after the user switches modes.
+    st.session_state["last_ps_mode"] = mode
+
 # ---------------------------
 # Helpers: build prompts
 # ---------------------------
-def build_journal_prompt(user_text: str, context_type: str) -> str:
+def build_journal_prompt(user_text: str, context_type: str,
+                         include_annotations: bool = True) -> str:
     """
     Create an instruction prompt for Gemini that describes
     how to turn free-text into a context-specific dream/memory doodle.
+
+    Pass include_annotations=False when the title/caption is generated
+    by the separate annotation sub-prompt and composed in afterwards.
     """
+    if include_annotations:
+        annotation_rule = (
+            "- Place any textual annotations as PointText in a subtle way"
+            " (small caption or title)."
+        )
+    else:
+        annotation_rule = (
+            "- Do NOT add titles or captions; textual annotations are generated"
+            " separately\n  and composed in afterwards."
+        )
     return f"""
 You are a creative code generator that ONLY outputs PaperScript code
 for the Paper.js library (no HTML, no markdown, no explanations).
@@ -122,7 +455,7 @@ Visual design rules:
   - If the story is about a dream of swimming across seas at night, use curves of the earth,
     waves, stars, and two swimmers.
   - If it is about a warm memory at a café, use circular tables, warm light halos, etc.
-- Place any textual annotations as PointText in a subtle way (small caption or title).
+{annotation_rule}
 - The drawing must fill a reasonably large canvas, for example about 1000x650.
   You can set it using:
     view.viewSize = new Size(1000, 650);
@@ -133,6 +466,89 @@ PaperScript constraints:
 - Start directly with PaperScript (JavaScript-like) code.
 - Define an onFrame(event) handler if you want animation.
 
+Output:
+- ONLY valid PaperScript code.
+    """
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _read_upload(name: str, data: bytes) -> pd.DataFrame:
+    """
+    Parse an uploaded spreadsheet into a DataFrame, cached on the file
+    name and raw bytes so Streamlit reruns don't re-parse the upload.
+
+    CSVs go through polars' multithreaded Rust parser when available,
+    then pandas' pyarrow engine, then the default C engine; Excel files
+    prefer the calamine reader over openpyxl.
+    """
+    buf = io.BytesIO(data)
+    if name.lower().endswith(".csv"):
+        if pl is not None:
+            try:
+                return pl.read_csv(buf).to_pandas()
+            except Exception:
+                buf.seek(0)  # odd dialects: let pandas have a go
+        try:
+            return pd.read_csv(buf, engine="pyarrow")
+        except (ImportError, ValueError):
+            buf.seek(0)
+            return pd.read_csv(buf)
+    try:
+        return pd.read_excel(buf, engine="calamine")
+    except (ImportError, ValueError):
+        buf.seek(0)
+        return pd.read_excel(buf)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _summarize_cached(columns, shape, head_hash, _df, max_rows) -> str:
+    # columns/shape/head_hash are the cache key; _df itself is not hashed.
+    dtypes = ", ".join(
+        f"{col} ({dt})" for col, dt in zip(_df.columns, _df.dtypes.astype(str))
+    )
+    # Quantize the sketch before it becomes prompt tokens: full float64
+    # digits and long strings are pure prefill cost for a doodle.
+    head = _df.head(max_rows).copy()
+    for c in head.select_dtypes("float").columns:
+        head[c] = head[c].round(3)
+    for c in head.select_dtypes("object").columns:
+        head[c] = head[c].astype(str).str.slice(0, 32)
+    # describe() over hundreds of columns is pure cost for a prompt sketch.
+    stats = _df.iloc[:, :64].describe(include="all").round(3)
+    return "\n".join([
+        "Columns:",
+        dtypes,
+        "",
+        "Example rows:",
+        head.to_csv(index=False),
+        "",
+        "Basic stats (where numeric):",
+        stats.to_csv(),
+    ])
+
+def build_annotation_prompt(user_text: str, context_type: str) -> str:
+    """
+    Side-prompt for the textual annotations only, generated in parallel
+    with the scene and appended to it afterwards.
+    """
+    return f"""
+You are a creative code generator that ONLY outputs PaperScript code
+for the Paper.js library (no HTML, no markdown, no explanations).
+
+Goal:
+- Write ONLY the textual annotations for an existing {context_type} doodle:
+  a short poetic title and, optionally, one small caption, as PointText.
+
+Story context:
+\"\"\"{user_text}\"\"\"
+
+
+Constraints:
+- At most about 15 lines of PaperScript.
+- Only PointText items (plus trivial positioning); do NOT draw the scene,
+  set a background, or change view.viewSize.
+- Place the title near the top-left (around x=40, y=40) with a soft,
+  semi-transparent fill color that reads on both light and dark paper.
+- Do not include HTML or <script> tags.
+
 Output:
 - ONLY valid PaperScript code.
     """
@@ -140,15 +556,12 @@ Output:
 def summarize_dataframe(df: pd.DataFrame, max_rows: int = 5) -> str:
     """
     Turn a DataFrame into a text summary for the model.
+
+    Cached on (columns, shape, hash of the head rows) so re-clicks on
+    the same upload skip the summary work.
     """
-    buf = io.StringIO()
-    buf.write("Columns:\n")
-    buf.write(", ".join([f"{col} ({str(df[col].dtype)})" for col in df.columns]))
-    buf.write("\n\nExample rows:\n")
-    buf.write(df.head(max_rows).to_csv(index=False))
-    buf.write("\n\nBasic stats (where numeric):\n")
-    buf.write(df.describe(include="all", datetime_is_numeric=True).to_csv())
-    return buf.getvalue()
+    head_hash = int(pd.util.hash_pandas_object(df.head(max_rows)).sum())
+    return _summarize_cached(tuple(df.columns), df.shape, head_hash, df, max_rows)
 
 def build_table_prompt(df: pd.DataFrame) -> str:
     summary = summarize_dataframe(df)
@@ -277,21 +690,86 @@ if mode == "Journal / Dream Text":
         height=200,
         placeholder="Example: I was swimming across the seas all over the globe with Gomma at night..."
     )
+    n_drafts = st.select_slider(
+        "Drafts to generate",
+        options=[1, 2, 3],
+        value=1,
+        help="A single draft streams in live; several drafts arrive together in one call."
+    )
 
     if st.button("Generate Visual", type="primary"):
         if not user_text.strip():
             st.error("Please write something first.")
+        elif n_drafts > 1:
+            prompt = build_journal_prompt(user_text, context_type)
+            with st.status(f"Drafting {n_drafts} doodles...") as status:
+                status.write("prompt built, requesting candidates")
+                scripts = generate_paperscript_drafts(prompt, GEMINI_API_KEY, n_drafts)
+                status.update(label=f"{len(scripts)} drafts ready", state="complete")
+
+            # The tabs carry their own iframes; drop any persisted single
+            # visual so it doesn't sit stale above them.
+            st.session_state.pop("last_ps_hash", None)
+            st.session_state.pop("last_ps_html", None)
+
+            tabs = st.tabs([f"Draft {i + 1}" for i in range(len(scripts))])
+            for tab, script in zip(tabs, scripts):
+                with tab:
+                    with st.expander("Show code"):
+                        st.code(script, language="javascript")
+                    components.html(build_paper_html(script), height=720, scrolling=False)
         else:
-            with st.spinner("Asking the doodle engine..."):
-                prompt = build_journal_prompt(user_text, context_type)
-                paperscript = generate_paperscript(prompt)
-
-            st.subheader("Generated PaperScript (for debugging / curiosity)")
-            with st.expander("Show code"):
-                st.code(paperscript, language="javascript")
-
-            html = build_paper_html(paperscript)
-            components.html(html, height=720, scrolling=False)
+            prompt = build_journal_prompt(user_text, context_type,
+                                          include_annotations=False)
+
+            st.subheader("Generated PaperScript (watch it build)")
+            # st.status is an expander itself and may not nest inside
+            # one, so the expander only holds the code slot and the
+            # status block opens at sibling level below it.
+            with st.expander("Show code", expanded=True):
+                code_slot = st.empty()
+
+            paperscript = _session_cache_get(prompt)
+            # Qualify with the entry type: the same text as a
+            # "dream" vs. a "memory" should not share a visual.
+            entry_key = f"{context_type}: {user_text}"
+            q_emb = None
+            if paperscript is None and GEMINI_API_KEY:
+                q_emb, paperscript = _semantic_cache_lookup(entry_key)
+            if paperscript is not None:
+                code_slot.code(paperscript, language="javascript")
+            elif not GEMINI_API_KEY:
+                paperscript = DEFAULT_FALLBACK_PAPERSCRIPT
+                code_slot.code(paperscript, language="javascript")
+            else:
+                with st.status("Doodling...", expanded=False) as status:
+                    status.write("prompt built")
+                    progress = {"first": True, "chars": 0, "t0": time.perf_counter()}
+
+                    def _on_progress(text):
+                        if progress["first"]:
+                            progress["first"] = False
+                            ttft = (time.perf_counter() - progress["t0"]) * 1000
+                            status.write(f"first token at {ttft:.0f} ms")
+                        code_slot.code(text, language="javascript")
+                        if len(text) - progress["chars"] > 500:
+                            progress["chars"] = len(text)
+                            status.write(f"{len(text)} chars so far...")
+
+                    scene, annotation = generate_scene_and_annotation(
+                        prompt,
+                        build_annotation_prompt(user_text, context_type),
+                        _on_progress,
+                    )
+                    status.write("draft complete, handing to Paper.js")
+                    status.update(label="Doodle ready", state="complete")
+                paperscript = scene.rstrip() + "\n\n" + annotation.strip() + "\n"
+                code_slot.code(paperscript, language="javascript")
+                _session_cache_put(prompt, paperscript)
+                if q_emb is not None:
+                    _semantic_cache_store(q_emb, entry_key, paperscript)
+
+            show_visual(paperscript)
 
 else:
     st.subheader("Spreadsheet / Tabular Data Input")
@@ -303,32 +781,50 @@ else:
     if uploaded is not None:
         # Try to read into DataFrame
         try:
-            if uploaded.name.lower().endswith(".csv"):
-                df = pd.read_csv(uploaded)
-            else:
-                df = pd.read_excel(uploaded)
+            df = _read_upload(uploaded.name, uploaded.getvalue())
         except Exception as e:
             st.error(f"Error reading file: {e}")
             df = None
 
         if df is not None:
             st.write("Preview of your data:")
-            st.dataframe(df.head())
+            # Small static slice: a 5x20 st.table keeps the websocket
+            # payload tiny vs. shipping the frame to a virtualized grid.
+            st.table(df.iloc[:5, :20].convert_dtypes())
 
             if st.button("Generate Grid Visual", type="primary"):
-                with st.spinner("Translating your table into a humanistic grid..."):
+                with st.status("Translating your table into a humanistic grid...") as status:
                     prompt = build_table_prompt(df)
-                    paperscript = generate_paperscript(prompt)
+                    status.write("table summarized, prompt built")
+                    # The grid is a structural template with little
+                    # creative freedom; the small flash model is plenty
+                    # and several times faster (and cheaper) than pro.
+                    paperscript = generate_paperscript(
+                        prompt,
+                        GEMINI_API_KEY,
+                        model_name="gemini-1.5-flash-8b",
+                        generation_config={"temperature": 0.6, "max_output_tokens": 3500},
+                    )
+                    status.update(label="Grid ready", state="complete")
 
                 st.subheader("Generated PaperScript (for debugging / curiosity)")
                 with st.expander("Show code"):
                     st.code(paperscript, language="javascript")
 
-                html = build_paper_html(paperscript)
-                components.html(html, height=720, scrolling=False)
+                show_visual(paperscript)
     else:
         st.info("Upload a CSV or Excel file to begin.")
 
+# Re-render the last visual from session state on every run. Identical
+# html into the same persistent placeholder lets Streamlit keep the
+# mounted iframe instead of remounting Paper.js on each widget rerun.
+# Gated on the mode that produced it so switching modes doesn't leave a
+# stale visual above the new content.
+if (st.session_state.get("last_ps_html")
+        and st.session_state.get("last_ps_mode") == mode):
+    with vis_container.container():
+        components.html(st.session_state["last_ps_html"], height=720, scrolling=False)
+
 st.markdown(
     """
 ---